@@ -7,10 +7,19 @@ last modified: 2021-10-04
 """
 
 from Keithley2612B import SMU2612B
+import matplotlib
+# the plot is only saved to a file, so no GUI backend is needed (also works over SSH / from cron)
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import numpy as np
 import datetime
+import threading
+import bisect
+import queue
 import csv
+import os
 import time
+import sys
 
 """ ******* Connect to the Sourcemeter ******** """
 # initialize the Sourcemeter and connect to it
@@ -22,104 +31,232 @@ smu_A = sm.get_channel(sm.CHANNEL_A)
 smu_B = sm.get_channel(sm.CHANNEL_B)
 
 """ ******* Configure the SMU Channel A ******** """
-# reset to default settings
-smu_A.reset()
-# setup the operation mode
-smu_A.set_mode_voltage_source()
-# set the voltage and current parameters
-smu_A.set_voltage_range(10)
-smu_A.set_voltage_limit(10)
-smu_A.set_voltage(0)
-smu_A.set_current(0)
-smu_A.enable_current_autorange
-smu_A.display_current()
-smu_A.set_sense_2wire()
-smu_A.set_measurement_speed_normal()
+# send the whole configuration of the channel to the SMU in one message
+with sm.batch():
+        # reset to default settings
+        smu_A.reset()
+        # setup the operation mode
+        smu_A.set_mode_voltage_source()
+        # set the voltage and current parameters
+        smu_A.set_voltage_range(10)
+        smu_A.set_voltage_limit(10)
+        smu_A.set_voltage(0)
+        smu_A.set_current(0)
+        smu_A.enable_current_autorange()
+        smu_A.display_current()
+        smu_A.set_sense_2wire()
+        smu_A.set_measurement_speed_normal()
 """ ******* Configure the SMU Channel B ******** """
 
-# reset to default settings
-smu_B.reset()
-# set the voltage and current parameters
-smu_B.display_current()
-smu_B.set_voltage_range(0.2)
-smu_B.set_voltage_limit(0.2)
-smu_B.enable_current_autorange
-smu_B.set_sense_2wire()
-smu_B.set_measurement_speed_normal()
-
-# Create unique filenames for saving the data
-time_for_name = datetime.datetime.now().strftime("%Y_%m_%d")
-
-filename_csv = 'test-' + time_for_name +'-scan_1.csv'
-filename_pdf = 'test-' + time_for_name +'-scan_1.pdf'
-# Header for
-with open(filename_csv, 'a') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',',  lineterminator='\n')
-        writer.writerow(["Voltage (V)", "Current (mA)", "Current_pd (mA)"])
+# send the whole configuration of the channel to the SMU in one message
+with sm.batch():
+        # reset to default settings
+        smu_B.reset()
+        # set the voltage and current parameters
+        smu_B.display_current()
+        smu_B.set_voltage_range(0.2)
+        smu_B.set_voltage_limit(0.2)
+        smu_B.enable_current_autorange()
+        smu_B.set_sense_2wire()
+        smu_B.set_measurement_speed_normal()
+
+# Create unique filenames for saving the data (with the time, so a second run on the same day does not overwrite the first)
+time_for_name = datetime.datetime.now().strftime("%Y_%m_%d_%H%M%S")
+
+filename_csv = f'test-{time_for_name}-scan_1.csv'
+filename_pdf = f'test-{time_for_name}-scan_1.pdf'
+# Header for; the file stays open so the data can be written while the sweep is running
+csvfile = open(filename_csv, 'w', newline='', buffering=1 << 16)
+writer = csv.writer(csvfile, delimiter=',',  lineterminator='\n')
+writer.writerow(["Voltage (V)", "Current (mA)", "Current_pd (mA)"])
 """ ******* Make a voltage-sweep and do some measurements ******** """
 # define sweep parameters
 sweep_start = -2
 sweep_end = 5
 sweep_step = 0.1
 delay_time = 10e-3 # 10 ms
-steps = int((sweep_end - sweep_start) / sweep_step) + 1
-
-# define variables we store the measurement in
-data_current = []
-data_voltage = []
-data_current_pd = []
-
-# enable the output
-smu_A.enable_output()
-smu_B.enable_output()
-
-time_start = time.time()
-# step through the voltages and get the values from the device
-for nr in range(steps):
-        time.sleep(delay_time)
-        # calculate the new voltage we want to set
-        voltage_to_set = sweep_start + (sweep_step * nr)
-        # set the new voltage to the SMU
-        smu_A.set_voltage(voltage_to_set)
-        # get current and voltage from the SMU and append it to the list so we can plot it later
-        [current, voltage] = smu_A.measure_current_and_voltage()
-        if abs(current) >= 0.09 and abs(current) <= 0.19:
-                smu_A.set_current_range(0.2)
-                smu_A.set_current_limit(0.2)
-        if abs(current) > 0.19 and abs(current) <= 0.29:
-                smu_A.set_current_range(0.3)  #300mA
-                smu_A.set_current_limit(0.3) #300mA
-        if abs(current) > 0.29 and abs(current) <= 0.3:
-                smu_A.set_current_range(0.4)  #400mA
-                smu_A.set_current_limit(0.4) #400mA
-        if abs(current) > 0.39 and abs(current) <= 0.4:
-                smu_A.set_current_range(0.7)  #700mA
-                smu_A.set_current_limit(0.7) #700mA
-        current_pd_a = smu_B.measure_current()
-        #time.sleep(delay_time)
-        #smu_A.set_voltage(0)
-        data_voltage.append(voltage)
-        data_current.append(current * 1000)
-        data_current_pd.append(current_pd_a * 1000)
-        print('Voltage: '+str(voltage)+'V; Current:'+str(current * 1000)+'mA; Current_PD: '+str(current_pd_a*1000)+'mA')
-
-time_finish = time.time()
+# round before truncating, otherwise a quotient like 69.99999999999999 loses the last step
+steps = int(round((sweep_end - sweep_start) / sweep_step)) + 1
+# the voltages of the sweep, calculated once (the end value is hit exactly)
+voltages = np.linspace(sweep_start, sweep_end, steps)
+# run the sweep on the SMU itself (fast) or step it from Python
+sweep_on_instrument = True
+current_limit = 0.7 # 700mA, current limit of Channel A
+# the SMU selects the current range by itself (autorange). Set step_current_range to True if the
+# sweep should instead raise range and limit of Channel A step by step: once the current reaches
+# current_thresholds[i] the range and limit are set to current_ranges[i + 1]
+step_current_range = False
+current_thresholds = [0.09, 0.19, 0.29, 0.39]
+current_ranges = [None, 0.2, 0.3, 0.4, 0.7] # 200mA, 300mA, 400mA, 700mA
+# print every data point to the console; set to False for unattended runs
+verbose = True
+log = sys.stdout.write
+
+# TSP script for an on-instrument sweep with step-by-step current ranges. The SMU runs the loop itself and
+# stores the readings in its buffers, so only the upload and one buffer read go over USB.
+# The SMU runs every line it receives on its own, so the script is loaded with loadscript / endscript and then run.
+# (TSP is Lua 5.0: no '#' length operator, table.getn instead)
+stepped_sweep_script = '''loadscript pySteppedSweep
+smua.nvbuffer1.clear()
+smua.nvbuffer2.clear()
+smub.nvbuffer1.clear()
+-- append every measurement instead of overwriting the first entry
+smua.nvbuffer1.appendmode = 1
+smua.nvbuffer2.appendmode = 1
+smub.nvbuffer1.appendmode = 1
+local voltages = {%(voltages)s}
+local thresholds = {%(thresholds)s}
+local ranges = {%(ranges)s}
+local range_index = 0
+for nr = 1, %(steps)d do
+    smua.source.levelv = voltages[nr]
+    delay(%(delay)s)
+    local current = smua.measure.iv(smua.nvbuffer1, smua.nvbuffer2)
+    smub.measure.i(smub.nvbuffer1)
+    local new_range_index = 0
+    for k = 1, table.getn(thresholds) do
+        if math.abs(current) >= thresholds[k] then
+            new_range_index = k
+        end
+    end
+    if new_range_index ~= range_index and new_range_index > 0 then
+        smua.source.rangei = ranges[new_range_index]
+        smua.measure.rangei = ranges[new_range_index]
+        smua.source.limiti = ranges[new_range_index]
+        range_index = new_range_index
+    end
+end
+endscript
+pySteppedSweep()'''
+
+# define variables we store the measurement in (both sweep modes fill them by index)
+data_current = np.empty(steps)
+data_voltage = np.empty(steps)
+data_current_pd = np.empty(steps)
+
+# the stepped sweep hands every sample over to a logging thread, so printing and writing
+# the data does not hold up the next measurement
+samples = queue.Queue()
+
+def log_samples():
+        while True:
+                sample = samples.get()
+                # None marks the end of the sweep
+                if sample is None:
+                        break
+                [nr, voltage, current, current_pd] = sample
+                data_voltage[nr] = voltage
+                data_current[nr] = current
+                data_current_pd[nr] = current_pd
+                if verbose:
+                        log(f'Voltage: {voltage:.6g}V; Current: {current:.6g}mA; Current_PD: {current_pd:.6g}mA\n')
+                writer.writerow([voltage, current, current_pd])
+
+# enable the output (both channels with one transfer)
+with sm.batch():
+        smu_A.enable_output()
+        smu_B.enable_output()
+
+logger = threading.Thread(target=log_samples, daemon=True)
+logger.start()
+time_start = time.perf_counter()
+try:
+        if sweep_on_instrument:
+                if step_current_range:
+                        # fill the parameters of this sweep into the script and let the SMU run it
+                        cmd = stepped_sweep_script % {'voltages': ', '.join(str(voltage_to_set) for voltage_to_set in voltages),
+                                                      'thresholds': ', '.join(str(value) for value in current_thresholds),
+                                                      'ranges': ', '.join(str(value) for value in current_ranges[1:]),
+                                                      'steps': steps,
+                                                      'delay': delay_time}
+                        # the SMU does not answer while the script runs
+                        sm.write_lua(cmd, check_for_errors=False)
+                        sm.wait_complete(steps * delay_time)
+                        # read voltage, current and photodiode current back in one go; printbuffer interleaves the buffers
+                        answer = sm.query_lua('printbuffer(1, ' + str(steps) + ', smua.nvbuffer2.readings, '
+                                              'smua.nvbuffer1.readings, smub.nvbuffer1.readings)')
+                        values = np.fromstring(answer, sep=',')
+                        # fill the preallocated arrays in place (A -> mA)
+                        data_voltage[:] = values[0::3]
+                        np.multiply(values[1::3], 1000, out=data_current)
+                        np.multiply(values[2::3], 1000, out=data_current_pd)
+                else:
+                        # the limit has to be set once; setting the range first is required, then autorange takes over again
+                        with sm.batch():
+                                smu_A.set_current_range(current_limit)
+                                smu_A.set_current_limit(current_limit)
+                                smu_A.enable_current_autorange()
+                        # the SMU steps channel A through the voltages and measures the photodiode current of channel B
+                        # at the same time; only the upload and one buffer read go over USB
+                        [current, voltage, current_pd_a] = sm.measure_dual_voltage_list_sweep(sm.CHANNEL_A, sm.CHANNEL_B,
+                                                                                              voltages, delay_time)
+                        # fill the preallocated arrays in place (A -> mA)
+                        data_voltage[:] = voltage
+                        np.multiply(current, 1000, out=data_current)
+                        np.multiply(current_pd_a, 1000, out=data_current_pd)
+                if verbose:
+                        for i in range(steps):
+                                log(f'Voltage: {data_voltage[i]:.6g}V; Current: {data_current[i]:.6g}mA; Current_PD: {data_current_pd[i]:.6g}mA\n')
+                np.savetxt(csvfile, np.column_stack([data_voltage, data_current, data_current_pd]), delimiter=',', fmt='%.9g')
+        else:
+                if not step_current_range:
+                        # the limit has to be set once; setting the range first is required, then autorange takes over again
+                        with sm.batch():
+                                smu_A.set_current_range(current_limit)
+                                smu_A.set_current_limit(current_limit)
+                                smu_A.enable_current_autorange()
+                range_index = 0
+                # look the methods up once instead of in every step
+                set_voltage = smu_A.set_voltage
+                measure = sm.measure_current_and_voltage_a_current_b
+                put_sample = samples.put
+                perf_counter = time.perf_counter
+                sleep = time.sleep
+                # one step every delay_time; the time the step itself takes is not added on top
+                next_step = perf_counter()
+                # step through the voltages and get the values from the device
+                # no error check after every command; the error queue is checked once after the loop
+                with sm.error_polling(False):
+                        for nr, voltage_to_set in enumerate(voltages):
+                                next_step += delay_time
+                                sleep_time = next_step - perf_counter()
+                                if sleep_time > 0:
+                                        sleep(sleep_time)
+                                # set the new voltage to the SMU
+                                set_voltage(voltage_to_set)
+                                # get current and voltage of channel A and the photodiode current of channel B with
+                                # one request and pass them to the logging thread
+                                [current, voltage, current_pd_a] = measure()
+                                if step_current_range:
+                                        # look up the range for this current and only talk to the SMU if the range changed
+                                        new_range_index = bisect.bisect_right(current_thresholds, abs(current))
+                                        if new_range_index != range_index and current_ranges[new_range_index] is not None:
+                                                # range and limit with one transfer
+                                                with sm.batch():
+                                                        smu_A.set_current_range(current_ranges[new_range_index])
+                                                        smu_A.set_current_limit(current_ranges[new_range_index])
+                                                range_index = new_range_index
+                                #time.sleep(delay_time)
+                                #smu_A.set_voltage(0)
+                                put_sample((nr, voltage, current * 1000, current_pd_a * 1000))
+finally:
+        # wait till the logging thread has printed and written all samples; this also keeps
+        # the data measured so far in the file if the sweep is interrupted by an error
+        samples.put(None)
+        logger.join()
+        # make sure the data is on the disk before the file is closed
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+        csvfile.close()
+
+time_finish = time.perf_counter()
 #time = time_start-time_finish
 print('time: '+str(time_finish-time_start)+' sec.')
-# Write the data in a csv
-f = open(filename_csv, 'a')
-for i in range(steps):
-        f.write(str(data_voltage[i])) #Voltage (V)
-        f.write(',')
-        f.write(str(data_current[i])) #Current (mA)
-        f.write(',')
-        f.write(str(data_current_pd[i])) #Current PD (mA)
-        f.write('\n')
-f.close()
 
 # disable the output
-smu_A.disable_output()
-smu_B.disable_output()
+with sm.batch():
+        smu_A.disable_output()
+        smu_B.disable_output()
 
 # properly disconnect from the device
 sm.disconnect()
@@ -136,5 +273,5 @@ color = 'tab:red'
 ax2.set_ylabel('Current_PD (mA)', color = color)
 ax2.plot(data_voltage, data_current_pd, color = color)
 ax2.tick_params(axis = 'y', labelcolor = color)
-plt.savefig(filename_pdf)
-plt.show()
+fig.savefig(filename_pdf, bbox_inches='tight')
+plt.close(fig)
@@ -2,12 +2,87 @@
 Library to access the basic functionality of the Keithley SourceMeter 2612B by using pyvisa for communication.
 last modified: 2021-10-04
 """
+import bisect
+import concurrent.futures
+import contextlib
+import enum
+import typing
+import numpy as np
 import pyvisa
+class Channel(enum.IntEnum):
+    """channels of the SMU; ALL addresses every available channel"""
+    A = 0
+    B = 1
+    ALL = 2
+class Unit(enum.IntEnum):
+    """quantities that can be sourced, limited or measured"""
+    VOLTAGE = 0
+    CURRENT = 1
+    CURRENT_VOLTAGE = 2
+    POWER = 3
+    RESISTANCE = 4
+class Mode(enum.IntEnum):
+    """source functions of a channel"""
+    CURRENT = 0
+    VOLTAGE = 1
+class Display(enum.IntEnum):
+    """measurements that can be shown on the display"""
+    VOLTAGE = 0
+    CURRENT = 1
+    RESISTANCE = 2
+    POWER = 3
+class Sense(enum.IntEnum):
+    """sense modes (2-wire or 4-wire)"""
+    TWO_WIRE = 0
+    FOUR_WIRE = 1
+class State(enum.IntEnum):
+    """output and autorange states"""
+    OFF = 0
+    ON = 1
+class IV(typing.NamedTuple):
+    """current and voltage of a simultaneous measurement"""
+    current: float
+    voltage: float
+# the words used in the LUA commands, indexed by the enums above
+_CHANNEL_PREFIX = ('smua', 'smub')
+_UNIT_NAME = ('v', 'i', 'iv', 'p', 'r')
+_MODE_NAME = ('DCAMPS', 'DCVOLTS')
+_DISPLAY_NAME = ('DCVOLTS', 'DCAMPS', 'OHMS', 'WATTS')
+_SENSE_NAME = ('SENSE_LOCAL', 'SENSE_REMOTE')
+_STATE_NAME = ('OFF', 'ON')
+# the complete LUA commands of the SMU2612B setters and measurements, built once for every channel and setting
+_CHANNELS = (Channel.A, Channel.B)
+_RANGE_UNITS = (Unit.VOLTAGE, Unit.CURRENT)
+_CMD_RESET = {c: _CHANNEL_PREFIX[c] + '.reset()' for c in _CHANNELS}
+_CMD_DISPLAY = {(c, d): 'display.' + _CHANNEL_PREFIX[c] + '.measure.func = display.MEASURE_' + _DISPLAY_NAME[d]
+                for c in _CHANNELS for d in Display}
+_CMD_NPLC = {c: _CHANNEL_PREFIX[c] + '.measure.nplc = {0}' for c in _CHANNELS}
+_CMD_MODE = {(c, m): _CHANNEL_PREFIX[c] + '.source.func = ' + _CHANNEL_PREFIX[c] + '.OUTPUT_' + _MODE_NAME[m]
+             for c in _CHANNELS for m in Mode}
+_CMD_SENSE = {(c, m): _CHANNEL_PREFIX[c] + '.sense = ' + _CHANNEL_PREFIX[c] + '.' + _SENSE_NAME[m]
+              for c in _CHANNELS for m in Sense}
+# source and measurement autorange are always set together
+_CMD_AUTORANGE = {(c, u, s): _CHANNEL_PREFIX[c] + '.source.autorange' + _UNIT_NAME[u] + ' = '
+                  + _CHANNEL_PREFIX[c] + '.AUTORANGE_' + _STATE_NAME[s] + '\n'
+                  + _CHANNEL_PREFIX[c] + '.measure.autorange' + _UNIT_NAME[u] + ' = '
+                  + _CHANNEL_PREFIX[c] + '.AUTORANGE_' + _STATE_NAME[s]
+                  for c in _CHANNELS for u in _RANGE_UNITS for s in State}
+_CMD_OUTPUT = {(c, s): _CHANNEL_PREFIX[c] + '.source.output = ' + _CHANNEL_PREFIX[c] + '.OUTPUT_' + _STATE_NAME[s]
+               for c in _CHANNELS for s in State}
+_CMD_MEASURE = {(c, u): 'print(' + _CHANNEL_PREFIX[c] + '.measure.' + _UNIT_NAME[u] + '())'
+                for c in _CHANNELS for u in Unit}
+# measuring on both channels at once. In case we want to measure voltage and current we get four
+# return parameters so the LUA command has to be different.
+_CMD_MEASURE.update({(Channel.ALL, u): 'ChA = smua.measure.' + _UNIT_NAME[u] + '()\n'
+                                       + 'ChB = smub.measure.' + _UNIT_NAME[u] + '()\n'
+                                       + 'print(ChA, ChB)' for u in Unit})
+_CMD_MEASURE[Channel.ALL, Unit.CURRENT_VOLTAGE] = 'iChA, vChA = smua.measure.iv()\n' \
+                                                  + 'iChB, vChB = smub.measure.iv()\n' \
+                                                  + 'print(iChA, vChA, iChB, vChB)'
 class _SMUChannel:
-    # variables to store the ranges that have been selected
-    # we need this information to check if the limit value is valid
-    __current_range = 0
-    __voltage_range = 0
+    # fixed set of attributes: no per-instance __dict__ and faster attribute access
+    __slots__ = ('__smu', '__channel', '__identification', '__current_range', '__voltage_range',
+                 '__cmd_range_v', '__cmd_range_i', '__cmd_limit_v', '__cmd_limit_i', '__cmd_level_v', '__cmd_level_i')
     def __init__(self, smu_object, smu_channel):
         """
         Implements the functionality for one individual channel of the SMU.
@@ -20,6 +95,25 @@ class _SMUChannel:
         # store the parameters in variables that can be accessed from other methods
         self.__smu = smu_object
         self.__channel = smu_channel
+        # model and channel do not change during a session, so the identification is built only once
+        if smu_channel == SMU2612B.CHANNEL_A:
+            channel = "Channel A"
+        else:
+            channel = "Channel B"
+        self.__identification = str(smu_object.identify_model()) + " " + channel
+        # variables to store the ranges that have been selected
+        # we need this information to check if the limit value is valid
+        self.__current_range = 0
+        self.__voltage_range = 0
+        # the commands of a channel only differ in the value, so we build them once here and
+        # only have to fill in the value when a setter is called
+        prefix = _CHANNEL_PREFIX[smu_channel]
+        self.__cmd_range_v = (prefix + '.source.rangev = {0}\n' + prefix + '.measure.rangev = {0}').format
+        self.__cmd_range_i = (prefix + '.source.rangei = {0}\n' + prefix + '.measure.rangei = {0}').format
+        self.__cmd_limit_v = (prefix + '.source.limitv = {0}').format
+        self.__cmd_limit_i = (prefix + '.source.limiti = {0}').format
+        self.__cmd_level_v = (prefix + '.source.levelv = {0}').format
+        self.__cmd_level_i = (prefix + '.source.leveli = {0}').format
     """
     #####################################################################################
     commands for setting the mode / ranges / limits / levels
@@ -29,13 +123,7 @@ class _SMUChannel:
         """
         returns a string with model and channel identification
         """
-        model = self.__smu.identify_model()
-        if self.__channel is SMU2612B.CHANNEL_A:
-            channel = "Channel A"
-        else:
-            channel = "Channel B"
-        identification_string = str(model) + " " + str(channel)
-        return identification_string
+        return self.__identification
     def reset(self):
         """
         Resets the channel to the default setting of the SMU.
@@ -86,7 +174,8 @@ class _SMUChannel:
         """
         # store the requested voltage range; we check it when the limit is set
         self.__voltage_range = value
-        self.__smu._set_range(self.__channel, SMU2612B.UNIT_VOLTAGE, value)
+        range_found = self.__smu._find_range(SMU2612B.UNIT_VOLTAGE, value)
+        self.__smu._write_setting(self.__cmd_range_v(range_found))
     def set_current_range(self, value):
         """
         Sets the range for the current.
@@ -102,7 +191,8 @@ class _SMUChannel:
         """
         # store the requested current range; we check it when the limit is set
         self.__current_range = value
-        self.__smu._set_range(self.__channel, SMU2612B.UNIT_CURRENT, value)
+        range_found = self.__smu._find_range(SMU2612B.UNIT_CURRENT, value)
+        self.__smu._write_setting(self.__cmd_range_i(range_found))
     def set_voltage_limit(self, value):
         """
         Limits the voltage output of the current source.
@@ -114,11 +204,12 @@ class _SMUChannel:
         Note:
             If you are in voltage source mode the voltage limit has no effect.
         Raises:
-            ValueError: If `value` is bigger then the selected voltage range.
+            ValueError: If the magnitude of `value` is bigger then the selected voltage range.
         """
-        # check if the limit is within the range
-        if value <= self.__voltage_range:
-            self.__smu._set_limit(self.__channel, SMU2612B.UNIT_VOLTAGE, value)
+        # check if the limit is within the range (the range is a magnitude, so negative limits are fine as well)
+        voltage_range = self.__voltage_range
+        if -voltage_range <= value <= voltage_range:
+            self.__smu._write_setting(self.__cmd_limit_v(value))
         else:
             raise ValueError("The limit is not within the range. Please set the range first")
     def set_current_limit(self, value):
@@ -133,11 +224,12 @@ class _SMUChannel:
         Note:
             If you are in current source mode the current limit has no effect.
         Raises:
-            ValueError: If `value` is bigger then the selected current range.
+            ValueError: If the magnitude of `value` is bigger then the selected current range.
         """
-        # check if the limit is within the range
-        if value <= self.__current_range:
-            self.__smu._set_limit(self.__channel, SMU2612B.UNIT_CURRENT, value)
+        # check if the limit is within the range (the range is a magnitude, so negative limits are fine as well)
+        current_range = self.__current_range
+        if -current_range <= value <= current_range:
+            self.__smu._write_setting(self.__cmd_limit_i(value))
         else:
             raise ValueError("The limit is not within the range. Please set the range first")
     def set_voltage(self, value):
@@ -155,7 +247,7 @@ class _SMUChannel:
            Positive values generate positive voltage from the high terminal of the source relative to the low terminal.
            Negative values generate negative voltage from the high terminal of the source relative to the low terminal.
         """
-        self.__smu._set_level(self.__channel, SMU2612B.UNIT_VOLTAGE, value)
+        self.__smu._write_setting(self.__cmd_level_v(value))
     def set_current(self, value):
         """
         Sets the output level of the current source.
@@ -170,7 +262,7 @@ class _SMUChannel:
            Positive values generate positive current from the high terminal of the source relative to the low terminal.
            Negative values generate negative current from the high terminal of the source relative to the low terminal.
         """
-        self.__smu._set_level(self.__channel, SMU2612B.UNIT_CURRENT, value)
+        self.__smu._write_setting(self.__cmd_level_i(value))
     def enable_output(self):
         """
         Sets the source output state to on.
@@ -245,34 +337,48 @@ class _SMUChannel:
     commands for setting the measurement speed / accuracy
     #####################################################################################
     """
+    def set_nplc(self, value):
+        """
+        Sets the integration aperture of the analog-to-digital converter (ADC) in PLC (Power Line Cycles).
+        Args:
+            value: the integration time in PLC (0.001 to 25)
+        Examples:
+            to integrate over half a power line cycle
+            >>> self.set_nplc(0.5)
+            or to select one of the predefined speeds by name
+            >>> self.set_nplc(SMU2612B.SPEEDS['med'])
+        Note:
+            The more PLC the higher the accuracy but the slower the measurement.
+        """
+        self.__smu._set_measurement_speed(self.__channel, value)
     def set_measurement_speed_fast(self):
         """
         This attribute controls the integration aperture for the analog-to-digital converter (ADC).
         fast corresponds to 0.01 PLC (Power Line Cycles) -> approx. 5000 measurements per second
         Results in: fast performance, but accuracy is reduced
         """
-        self.__smu._set_measurement_speed(self.__channel, SMU2612B.SPEED_FAST)
+        self.set_nplc(SMU2612B.SPEED_FAST)
     def set_measurement_speed_med(self):
         """
         This attribute controls the integration aperture for the analog-to-digital converter (ADC).
         fast corresponds to 0.1 PLC (Power Line Cycles) -> approx. 500 measurements per second
         Results in: speed and accuracy are balanced
         """
-        self.__smu._set_measurement_speed(self.__channel, SMU2612B.SPEED_MED)
+        self.set_nplc(SMU2612B.SPEED_MED)
     def set_measurement_speed_normal(self):
         """
         This attribute controls the integration aperture for the analog-to-digital converter (ADC).
         fast corresponds to 1 PLC (Power Line Cycles) -> approx. 50 measurements per second
         Results in: speed and accuracy are balanced
         """
-        self.__smu._set_measurement_speed(self.__channel, SMU2612B.SPEED_NORMAL)
+        self.set_nplc(SMU2612B.SPEED_NORMAL)
     def set_measurement_speed_hi_accuracy(self):
         """
         This attribute controls the integration aperture for the analog-to-digital converter (ADC).
         fast corresponds to 10 PLC (Power Line Cycles) -> approx. 5 measurements per second
         Results in: high accuracy, but speed is reduced
         """
-        self.__smu._set_measurement_speed(self.__channel, SMU2612B.SPEED_HI_ACCURACY)
+        self.set_nplc(SMU2612B.SPEED_HI_ACCURACY)
     """
     #####################################################################################
     commands for reading values
@@ -311,13 +417,16 @@ class _SMUChannel:
         Use this function if you need exact time correlation between voltage and current.
         Examples:
             measure current and voltage simultaneously
-            >>> [current, voltage] = self.measure_current_and_voltage()
+            >>> current, voltage = self.measure_current_and_voltage()
+            or access the values by name
+            >>> reading = self.measure_current_and_voltage()
+            >>> reading.current, reading.voltage
         Returns:
-            list: a list of the two measured values.
-                current as the first list element
-                voltage as the second list element
+            IV: the two measured values.
+                current as the first element
+                voltage as the second element
         """
-        return self.__smu._measure(self.__channel, SMU2612B.UNIT_CURRENT_VOLTAGE)
+        return IV(*self.__smu._measure(self.__channel, SMU2612B.UNIT_CURRENT_VOLTAGE))
     def measure_voltage_sweep(self, start_value, stop_value, settling_time, points):
         """
         Causes the SMU to make a voltage sweep based on a staircase profile.
@@ -332,11 +441,11 @@ class _SMUChannel:
         Examples:
             perform a voltage sweep from 0 V to 5 V with 500 steps (so 10 mV step size) as fast as possible
             >>> self.set_measurement_speed_fast()
-            >>> [current_list, voltage_list] = self.measure_voltage_sweep(0, 5, 0, 500)
+            >>> current, voltage = self.measure_voltage_sweep(0, 5, 0, 500)
         Returns:
-            list: the returning list contains itself two lists
-                first element is a list of the measured current values
-                second element is a list of the voltage source values (not the actual measured voltage)
+            tuple: two numpy arrays (single precision)
+                first element is an array of the measured current values
+                second element is an array of the voltage source values (not the actual measured voltage)
         """
         return self.__smu._measure_linear_sweep(self.__channel, SMU2612B.UNIT_VOLTAGE,
                                                 start_value, stop_value, settling_time, points)
@@ -355,42 +464,132 @@ class _SMUChannel:
             perform a current sweep from 1 mA to 100 mA with 1000 steps (so 0.1 mA step size)
             and let the device under test 1 second time to settle before taking a measurement
             >>> self.set_measurement_speed_normal()
-            >>> [current_list, voltage_list] = self.measure_voltage_sweep(1e-3, 0.1, 1, 1000)
+            >>> current, voltage = self.measure_voltage_sweep(1e-3, 0.1, 1, 1000)
         Returns:
-            list: the returning list contains itself two lists
-                first element is a list of the current source values (not the actual measured current)
-                second element is a list of the measured voltage
+            tuple: two numpy arrays (single precision)
+                first element is an array of the current source values (not the actual measured current)
+                second element is an array of the measured voltage
         """
         return self.__smu._measure_linear_sweep(self.__channel, SMU2612B.UNIT_CURRENT,
                                                 start_value, stop_value, settling_time, points)
+    """
+    #####################################################################################
+    commands for reading values in the background
+    #####################################################################################
+    """
+    def measure_voltage_async(self):
+        """
+        Starts a voltage measurement in the background and returns right away.
+        Use this function if you want to do something else while the SMU integrates (e.g. at high NPLC).
+        Examples:
+            start the measurement, do some other work and collect the reading afterwards
+            >>> future = self.measure_voltage_async()
+            >>> voltage = future.result()
+        Returns:
+            concurrent.futures.Future: its result is the value of the reading in volt
+        Note:
+            Don't send other commands to the SMU before the result is there.
+        """
+        return self.__smu._submit(self.__smu._measure, self.__channel, SMU2612B.UNIT_VOLTAGE)
+    def measure_current_async(self):
+        """
+        Starts a current measurement in the background and returns right away.
+        Returns:
+            concurrent.futures.Future: its result is the value of the reading in ampere
+        Note:
+            Don't send other commands to the SMU before the result is there.
+        """
+        return self.__smu._submit(self.__smu._measure, self.__channel, SMU2612B.UNIT_CURRENT)
+    def measure_current_and_voltage_async(self):
+        """
+        Starts a simultaneous voltage and current measurement in the background and returns right away.
+        Returns:
+            concurrent.futures.Future: its result is the same as the one of measure_current_and_voltage()
+        Note:
+            Don't send other commands to the SMU before the result is there.
+        """
+        return self.__smu._submit(self.measure_current_and_voltage)
 class SMU2612B:
-    # define strings that are used in the LUA commands
-    CHANNEL_A = "a"
-    CHANNEL_B = "b"
-    # defines an arbitrary word; when used the program tries to access all available channels
-    CHANNEL_ALL = "all"
-    CURRENT_MODE = "DCAMPS"
-    VOLTAGE_MODE = "DCVOLTS"
-    DISPLAY_VOLTAGE = 'DCVOLTS'
-    DISPLAY_CURRENT = 'DCAMPS'
-    DISPLAY_RESISTANCE = 'OHMS'
-    DISPLAY_POWER = 'WATTS'
-    SENSE_MODE_2_WIRE = 'SENSE_LOCAL'
-    SENSE_MODE_4_WIRE = 'SENSE_REMOTE'
-    UNIT_VOLTAGE = "v"
-    UNIT_CURRENT = "i"
-    UNIT_CURRENT_VOLTAGE = "iv"
-    UNIT_POWER = "p"
-    UNIT_RESISTANCE = "r"
-    STATE_ON = "ON"
-    STATE_OFF = "OFF"
+    # the old names of the enum members, so existing code keeps working
+    CHANNEL_A = Channel.A
+    CHANNEL_B = Channel.B
+    # when used the program tries to access all available channels
+    CHANNEL_ALL = Channel.ALL
+    CURRENT_MODE = Mode.CURRENT
+    VOLTAGE_MODE = Mode.VOLTAGE
+    DISPLAY_VOLTAGE = Display.VOLTAGE
+    DISPLAY_CURRENT = Display.CURRENT
+    DISPLAY_RESISTANCE = Display.RESISTANCE
+    DISPLAY_POWER = Display.POWER
+    SENSE_MODE_2_WIRE = Sense.TWO_WIRE
+    SENSE_MODE_4_WIRE = Sense.FOUR_WIRE
+    UNIT_VOLTAGE = Unit.VOLTAGE
+    UNIT_CURRENT = Unit.CURRENT
+    UNIT_CURRENT_VOLTAGE = Unit.CURRENT_VOLTAGE
+    UNIT_POWER = Unit.POWER
+    UNIT_RESISTANCE = Unit.RESISTANCE
+    STATE_ON = State.ON
+    STATE_OFF = State.OFF
     SPEED_FAST = 0.01
     SPEED_MED = 0.1
     SPEED_NORMAL = 1
     SPEED_HI_ACCURACY = 10
-    # maximum amount of values that can be read from the Keithley buffer without an error from the
-    # pyvisa interface. We set it to 1000 values.
-    __PYVISA_MAX_BUFFER_REQUEST = 1000
+    # the predefined speeds by name, e.g. to select them from a configuration
+    SPEEDS = {'fast': SPEED_FAST, 'med': SPEED_MED, 'normal': SPEED_NORMAL, 'hi_accuracy': SPEED_HI_ACCURACY}
+    # maximum amount of values that are read from the Keithley buffer with one request. The buffers are read as
+    # binary single precision floats (4 bytes per value), so 50000 values (200 kB) still fit in one pyvisa chunk.
+    __PYVISA_MAX_BUFFER_REQUEST = 50000
+    # LUA functions for the sweeps. They are sent to the SMU once (on first use, inside loadscript / endscript) and
+    # then only called, so the SMU doesn't have to compile the whole script again for every sweep.
+    # (TSP is Lua 5.0; the smu and the factory sweep function are passed as arguments)
+    __LUA_FUNCTIONS = {
+        'pyLinearSweep': 'function pyLinearSweep(smu, sweep, start, stop, settle, points)\n'
+                         '    smu.nvbuffer1.clear()\n'
+                         '    smu.nvbuffer1.appendmode = 1\n'
+                         '    smu.nvbuffer1.collectsourcevalues = 1\n'
+                         '    smu.measure.count = 1\n'
+                         '    sweep(smu, start, stop, settle, points)\n'
+                         'end',
+        # the source values of the source channel have to be set (linearv or listv) before pyDualSweep is called
+        'pyDualSweep': 'function pyDualSweep(source, detector, settle, points)\n'
+                       '    source.nvbuffer1.clear()\n'
+                       '    source.nvbuffer2.clear()\n'
+                       '    detector.nvbuffer1.clear()\n'
+                       '    source.trigger.source.action = source.ENABLE\n'
+                       '    source.trigger.measure.iv(source.nvbuffer1, source.nvbuffer2)\n'
+                       '    source.trigger.measure.action = source.ENABLE\n'
+                       '    source.trigger.endpulse.action = source.SOURCE_HOLD\n'
+                       '    source.trigger.count = points\n'
+                       '    trigger.timer[1].delay = settle\n'
+                       '    trigger.timer[1].count = 1\n'
+                       '    trigger.timer[1].passthrough = false\n'
+                       '    trigger.timer[1].stimulus = source.trigger.SOURCE_COMPLETE_EVENT_ID\n'
+                       '    source.trigger.measure.stimulus = trigger.timer[1].EVENT_ID\n'
+                       '    detector.trigger.source.action = detector.DISABLE\n'
+                       '    detector.trigger.measure.i(detector.nvbuffer1)\n'
+                       '    detector.trigger.measure.action = detector.ENABLE\n'
+                       '    detector.trigger.measure.stimulus = trigger.timer[1].EVENT_ID\n'
+                       '    detector.trigger.count = points\n'
+                       '    detector.trigger.initiate()\n'
+                       '    source.trigger.initiate()\n'
+                       '    waitcomplete()\n'
+                       'end',
+        # appends the values of the table `values` to the table `list`; long lists are sent in several lines with it
+        'pyAppend': 'function pyAppend(list, values)\n'
+                    '    for i = 1, table.getn(values) do\n'
+                    '        table.insert(list, values[i])\n'
+                    '    end\n'
+                    'end',
+    }
+    # amount of values sent in one line when a list of source values is uploaded to the SMU
+    __LUA_LIST_CHUNK = 50
+    # the lowest power line frequency (Hz) the SMU may run on; used to estimate how long a measurement takes
+    __LINE_FREQUENCY = 50
+    # the open sessions and the objects that own them by VISA resource name, so a new object for the same
+    # instrument can take them over
+    __sessions = {}
+    # one resource manager for all objects, creating it loads the VISA library every time
+    __resource_manager = None
     def __init__(self, visa_resource_name, timeout=1000):
         """
         Implements the global (channel independent) functionality for the Keithley SMU 2600 series.
@@ -399,37 +598,111 @@ class SMU2612B:
             visa_resource_name: use exactly the VISA-resource-name you see in your NI-MAX
         Returns:
             pyvisa.ResourceManager.open_resource: Object to control the SMU
+        Note:
+            If an earlier object for the same instrument was not disconnected its session is reused
+            (as long as the SMU still answers on it). The earlier object is disconnected then, so disconnecting
+            it later doesn't close the session of the new object.
         """
         # Variables to store the capabilities of the instrument
         self.__voltage_ranges = None
         self.__current_ranges = None
         self.__channel_b_present = None
+        # the measurement commands this instrument supports, by (channel, unit)
+        self.__cmd_measure = None
+        # the model number never changes while we are connected, so we only ask for it once
+        self.__model = None
         # variable to store if the debug output was enabled
         self.__debug = False
-        # open the resource manager
-        __rm = pyvisa.ResourceManager()
-        # Connect to the device
-        self.__instrument = __rm.open_resource(visa_resource_name)
+        # commands collected inside a batch() block (None if no batch is open) and whether the error queue
+        # should be checked when they are sent
+        self.__batch_commands = None
+        self.__batch_check_for_errors = True
+        # False inside an error_polling(False) block: the error queue is then only checked when the block is left
+        self.__error_polling = True
+        # the channel objects handed out by get_channel, so every channel exists only once
+        self.__channels = {}
+        # worker thread for the *_async measurements; only created when it is needed
+        self.__executor = None
+        # the integration time of the channels in PLC (1 is the default of the SMU); needed to estimate
+        # how long a sweep takes
+        self.__nplc = {SMU2612B.CHANNEL_A: 1, SMU2612B.CHANNEL_B: 1}
+        # names of the LUA functions that have already been sent to the SMU
+        self.__installed_lua_functions = set()
+        self.__visa_resource_name = visa_resource_name
+        # take over the session of an earlier object if there is one, it's already cleared
+        self.__instrument = self.__reuse_session(visa_resource_name)
+        reused = self.__instrument is not None
+        if not reused:
+            # open the resource manager (only for the first object)
+            if SMU2612B.__resource_manager is None:
+                SMU2612B.__resource_manager = pyvisa.ResourceManager()
+            # Connect to the device
+            self.__instrument = SMU2612B.__resource_manager.open_resource(visa_resource_name)
+        SMU2612B.__sessions[visa_resource_name] = (self.__instrument, self)
         self.__connected = True
         # set the timeout
         self.__instrument.timeout = timeout
-        # clear the error queue
-        self.__clear_error_queue()
-        # clear everything that may is in the buffer
-        self.__instrument.clear()
-        # find out the ranges of the device and set the limits
-        model = self.identify_model()
-        self.set_model_limits(model)
+        # read large buffers in one go instead of many small pieces and let pyvisa strip / expect the
+        # line feed that terminates every answer of the SMU
+        self.__instrument.chunk_size = 1 << 20
+        self.__instrument.read_termination = '\n'
+        self.__instrument.write_termination = '\n'
+        # over ethernet every command is a small packet: send it right away instead of waiting for more data
+        if self.__instrument.interface_type == pyvisa.constants.InterfaceType.tcpip:
+            self.__instrument.set_visa_attribute(pyvisa.constants.VI_ATTR_TCPIP_NODELAY, True)
+        if not reused:
+            # clear the error queue
+            self.__clear_error_queue()
+            # clear everything that may is in the buffer
+            self.__instrument.clear()
+        # find out the model and if the device has a channel B with one query and set the limits
+        [self.__model, channel_b] = self.query_lua('print(localnode.model, smub ~= nil)').split('\t')
+        self.set_model_limits(self.__model)
+        self.__channel_b_present = channel_b == 'true'
+        # decide once which measurements are possible, so _measure doesn't have to check the channel every time
+        if self.__channel_b_present:
+            self.__cmd_measure = _CMD_MEASURE
+        else:
+            self.__cmd_measure = {key: cmd for key, cmd in _CMD_MEASURE.items() if key[0] == SMU2612B.CHANNEL_A}
     def disconnect(self):
         """
         Disconnect the instrument. After this no further communication is possible.
         """
         if self.__connected:
+            # let running background measurements finish before the session is closed
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=True)
+                self.__executor = None
             self.__instrument.close()
+            SMU2612B.__sessions.pop(self.__visa_resource_name, None)
             self.__connected = False
+    @classmethod
+    def __reuse_session(cls, visa_resource_name):
+        """
+        internal function that returns the still working session of an earlier object for the instrument or None.
+        The earlier object is disconnected, it must not use or close the session anymore.
+        """
+        session = cls.__sessions.pop(visa_resource_name, None)
+        if session is None:
+            return None
+        instrument, owner = session
+        # let running background measurements of the earlier object finish, they use the session
+        if owner.__executor is not None:
+            owner.__executor.shutdown(wait=True)
+            owner.__executor = None
+        owner.__connected = False
+        try:
+            # if the SMU answers a trivial request with exactly that answer nothing else is pending on the session
+            if instrument.query('print("alive")').rstrip('\r\n') == 'alive':
+                return instrument
+            instrument.close()
+        except (pyvisa.VisaIOError, pyvisa.errors.InvalidSession):
+            pass
+        return None
     def get_channel(self, channel):
         """
         Gives you an object with which you can control the individual parameters of a channel.
+        Every call for the same channel returns the same object.
         Args:
             channel: the channel you want to connect to.
                 Use the keywords SMU2612B.CHANNEL_A or SMU2612B.CHANNEL_B
@@ -439,9 +712,11 @@ class SMU2612B:
             ValueError: If the channel is not available.
         """
         # check if the channel b is available. We don't have to check channel a because every smu has one
-        if channel is SMU2612B.CHANNEL_B and not self.__channel_b_present:
+        if channel == SMU2612B.CHANNEL_B and not self.__channel_b_present:
             raise ValueError("No channel B on this model")
-        return _SMUChannel(self, channel)
+        if channel not in self.__channels:
+            self.__channels[channel] = _SMUChannel(self, channel)
+        return self.__channels[channel]
     def enable_debug_output(self):
         """
         Enables the debug output of all communication to the SMU.
@@ -453,6 +728,65 @@ class SMU2612B:
         Disables the debug output. Nothing will be printed to the console that you haven't specified yourself.
         """
         self.__debug = False
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Collects all commands written to the SMU inside the with-block and sends them as one message when the
+        block is left. The error queue is checked once at the end instead of after every single command.
+        Examples:
+            configure a channel with a single transfer to the SMU
+            >>> with self.batch():
+            >>>     smu_a.reset()
+            >>>     smu_a.set_voltage_range(2)
+            >>>     smu_a.set_voltage(1)
+        Note:
+            A query inside the block can't wait for the end of the block, so the commands collected so far
+            are sent together with the query.
+            Nested batch() blocks are merged into the outermost one.
+            If a command the SMU doesn't answer on for a while (written with check_for_errors=False, e.g. the
+            start of a sweep) is in the block, the error queue is not checked at the end.
+        """
+        if self.__batch_commands is not None:
+            # we are already inside a batch; the outermost one sends the commands
+            yield
+            return
+        self.__batch_commands = []
+        self.__batch_check_for_errors = True
+        try:
+            yield
+        finally:
+            commands = self.__batch_commands
+            self.__batch_commands = None
+            if commands:
+                self.write_lua('\n'.join(commands), check_for_errors=False)
+                if self.__batch_check_for_errors and self.__error_polling:
+                    self.flush_errors()
+    @contextlib.contextmanager
+    def error_polling(self, enabled):
+        """
+        Switches the automatic checks of the error queue (after commands, batches and single measurements) on or
+        off inside the with-block. Every check is an extra request to the SMU, so measurement loops get faster
+        without them. If the block switched the checks off, the error queue is checked once when it is left.
+        Args:
+            enabled (bool): False to skip the checks inside the block
+        Examples:
+            step through a sweep with one error check at the end
+            >>> with self.error_polling(False):
+            >>>     for voltage_to_set in voltages:
+            >>>         smu_a.set_voltage(voltage_to_set)
+            >>>         current, voltage = smu_a.measure_current_and_voltage()
+        Raises:
+            ValueError: If there are errors stored at the SMU when the block is left
+        """
+        previous = self.__error_polling
+        self.__error_polling = enabled
+        try:
+            yield
+        finally:
+            self.__error_polling = previous
+        # report the errors of the whole block at once
+        if previous and not enabled:
+            self.flush_errors()
     """
     #####################################################################################
     commands for communicating with the instrument via the pyvisa interface
@@ -476,13 +810,96 @@ class SMU2612B:
         response = self.__instrument.query(str(cmd))
         if self.__debug:
             print('Error msg: ' + str(response))
-        try:
-            [code, message] = response.split('\t', 1)
-            if float(code) != 0:
-                # if we have an error code something happened and we should raise an error
-                raise ValueError('The SMU said: "' + str(message) + '"  /  Keithley-Error-Code: ' + str(code))
-        except:
+        code, separator, message = response.partition('\t')
+        if not separator:
             raise ValueError('The SMU said: "' + str(response))
+        # the SMU prints the code as a number like 0.00000e+00, so we have to compare the value and not the text
+        if float(code) != 0:
+            # if we have an error code something happened and we should raise an error
+            raise ValueError('The SMU said: "' + str(message) + '"  /  Keithley-Error-Code: ' + str(code))
+    def flush_errors(self):
+        """
+        Checks the error queue of the SMU once and raises all errors that have been collected since the last check.
+        The setters of the channels don't check the error queue after every command; their errors are reported by
+        the next measurement, at the end of a batch() block or when this method is called
+        (inside an error_polling(False) block only when the block is left).
+        Raises:
+            ValueError: If there are errors stored at the SMU
+        """
+        count = int(float(self.query_lua('print(errorqueue.count)', check_for_errors=False)))
+        if count == 0:
+            return
+        messages = []
+        for _ in range(count):
+            response = self.query_lua('errorcode, message = errorqueue.next()\nprint(errorcode, message)',
+                                      check_for_errors=False)
+            code, _, message = response.partition('\t')
+            messages.append('The SMU said: "' + str(message) + '"  /  Keithley-Error-Code: ' + str(code))
+        raise ValueError('\n'.join(messages))
+    def _submit(self, function, *args):
+        """
+        internal function to run function(*args) in the background. Returns a concurrent.futures.Future.
+        """
+        if self.__executor is None:
+            # a single worker, so the requests to the instrument are never sent in parallel
+            self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return self.__executor.submit(function, *args)
+    def __wait_complete(self, duration):
+        """
+        internal function that waits till the SMU has finished everything it was asked to do (e.g. a sweep).
+        `duration` is the time in seconds the SMU is expected to need for it.
+        """
+        timeout = self.__instrument.timeout
+        # the SMU only answers after it has finished, so the timeout has to cover the whole duration. The estimate
+        # doesn't include the auto delays, autorange and autozero of the channels, so we allow twice the time.
+        # An infinite timeout (None or inf) already covers it.
+        if timeout is not None and timeout != float('inf'):
+            self.__instrument.timeout = int(timeout + 2 * duration * 1000)
+        try:
+            self.query_lua('waitcomplete()\nprint("done")', check_for_errors=False)
+        except pyvisa.VisaIOError as error:
+            if error.error_code != pyvisa.constants.StatusCode.error_timeout:
+                raise
+            # it takes even longer: keep waiting for the answer (otherwise it would stay in the output queue
+            # and the next read would get it instead of its own answer)
+            while True:
+                try:
+                    self.__instrument.read()
+                    break
+                except pyvisa.VisaIOError as error:
+                    if error.error_code != pyvisa.constants.StatusCode.error_timeout:
+                        raise
+        finally:
+            self.__instrument.timeout = timeout
+    def __call_lua_function(self, name, *args):
+        """
+        internal function to call one of the LUA functions of __LUA_FUNCTIONS. The function is sent to the SMU
+        before the first call.
+        """
+        if name not in self.__installed_lua_functions:
+            # the SMU runs every line it receives on its own, so a multi-line function has to be loaded as a
+            # script (e.g. pyLinearSweepScript) that is run once to define the function
+            script = name + 'Script'
+            self.write_lua('loadscript ' + script + '\n' + self.__LUA_FUNCTIONS[name] + '\nendscript\n'
+                           + script + '()', check_for_errors=False)
+            self.__installed_lua_functions.add(name)
+        self.write_lua(name + '(' + ', '.join(str(arg) for arg in args) + ')', check_for_errors=False)
+    def __query_binary(self, cmd, points):
+        """
+        internal function to query `points` values printed by the SMU as little endian single precision floats
+        (the SMU has to be set to format.REAL32 and format.LITTLEENDIAN before)
+        """
+        if self.__batch_commands:
+            # send the commands of the open batch together with the query (like query_lua), otherwise e.g. the
+            # switch to format.REAL32 would only be sent after the read
+            cmd = '\n'.join(self.__batch_commands + [str(cmd)])
+            self.__batch_commands = []
+        if self.__debug:
+            print('Query binary cmd: ' + str(cmd))
+        # printbuffer answers with an IEEE block of indefinite length ("#0"), so we have to tell pyvisa
+        # how many values to expect
+        return self.__instrument.query_binary_values(str(cmd), datatype='f', is_big_endian=False,
+                                                     container=np.ndarray, data_points=points)
     def write_lua(self, cmd, check_for_errors=True):
         """
         Writes a command to the pyvisa connection. It expects no return message from the SMU
@@ -491,12 +908,18 @@ class SMU2612B:
             check_for_errors: by default the error queue of the SMU is checked after every command that is send to the
                 SMU. In some cases the SMU will not respond to this check and a pyvisa timeout would occur. In such
                 a case you can disable this check.
+        Note:
+            Inside a batch() block the command is only collected and sent when the block is left.
         """
+        if self.__batch_commands is not None:
+            self.__batch_commands.append(str(cmd))
+            self.__batch_check_for_errors = self.__batch_check_for_errors and check_for_errors
+            return
         if self.__debug:
             print('Write cmd: ' + str(cmd))
         self.__instrument.write(str(cmd))
         # check if the command executed without any errors
-        if check_for_errors:
+        if check_for_errors and self.__error_polling:
             self.__check_error_queue()
     def query_lua(self, cmd, check_for_errors=True):
         """
@@ -508,6 +931,10 @@ class SMU2612B:
                 SMU. In some cases the SMU will not respond to this check and a pyvisa timeout would occur. In such
                 a case you can disable this check.
         """
+        if self.__batch_commands:
+            # send the commands of the open batch together with the query
+            cmd = '\n'.join(self.__batch_commands + [str(cmd)])
+            self.__batch_commands = []
         if self.__debug:
             print('Query cmd: ' + str(cmd))
         # send the request to the device
@@ -515,9 +942,21 @@ class SMU2612B:
         if self.__debug:
             print('Query answer: ' + str(reading))
         # check if the command executed without any errors
-        if check_for_errors:
+        if check_for_errors and self.__error_polling:
             self.__check_error_queue()
         return reading
+    def wait_complete(self, duration):
+        """
+        Waits till the SMU has finished all commands sent before, e.g. a script started with write_lua().
+        The timeout is raised for the expected duration and the SMU is waited for even if it takes longer.
+        Args:
+            duration: the time in seconds the SMU is expected to need for the commands.
+        Examples:
+            run a script that takes about 5 s and wait till it is finished
+            >>> self.write_lua('myScript()', check_for_errors=False)
+            >>> self.wait_complete(5)
+        """
+        self.__wait_complete(duration)
     """
     #####################################################################################
     commands that gather information of the device and set parameter
@@ -526,10 +965,13 @@ class SMU2612B:
     def identify_model(self):
         """
         Returns the model number of the SMU. Based on this string the model limits are set.
+        The model number is only queried once per connection.
         Returns:
             str: the model number of the SMU
         """
-        return self.query_lua('print(localnode.model)')
+        if self.__model is None:
+            self.__model = self.query_lua('print(localnode.model)')
+        return self.__model
     def set_model_limits(self, model_number):
         """
         This function is used to set the model specific differences. This method is called at the initialisation
@@ -539,24 +981,25 @@ class SMU2612B:
         """
         if self.__debug:
             print("Model " + str(model_number) + " detected. Setting ranges ...")
+        # tuples, so the ranges handed out by get_available_*_ranges can't be changed by accident
+        # (sorted ascending, _find_range relies on it)
         if "2612B" in model_number:
-            self.__voltage_ranges = [0.2, 2, 20, 200]
-            self.__current_ranges = [1E-7, 1E-6, 1E-5, 1E-4, 1E-3, 1E-2, 1E-1, 1, 1.5]
-            self.__channel_b_present = True
+            self.__voltage_ranges = (0.2, 2, 20, 200)
+            self.__current_ranges = (1E-7, 1E-6, 1E-5, 1E-4, 1E-3, 1E-2, 1E-1, 1, 1.5)
         else:
             raise ValueError("unknown model number")
     def get_available_voltage_ranges(self):
         """
-        Returns a list containing the available voltage ranges based on the model limits.
+        Returns the available voltage ranges based on the model limits.
         Returns:
-            list: containing the available voltage ranges
+            tuple: containing the available voltage ranges
         """
         return self.__voltage_ranges
     def get_available_current_ranges(self):
         """
-        Returns a list containing the available current ranges based on the model limits.
+        Returns the available current ranges based on the model limits.
         Returns:
-            list: containing the available current ranges
+            tuple: containing the available current ranges
         """
         return self.__current_ranges
     """
@@ -570,11 +1013,11 @@ class SMU2612B:
         Use this function if you need exact time correlation between the voltage of the two channels.
         Examples:
             measure voltage simultaneously on both channels
-            >>> [v_chan_a, v_chan_b] = self.measure_voltage()
+            >>> v_chan_a, v_chan_b = self.measure_voltage()
         Returns:
-            list: a list of floats containing the two measured values.
-                voltage measurement of channel a as the first list element
-                voltage measurement of channel b as the second list element
+            tuple: the two measured values as floats.
+                voltage measurement of channel a as the first element
+                voltage measurement of channel b as the second element
         Raises:
             ValueError: If the SMU has just one channel
         """
@@ -585,11 +1028,11 @@ class SMU2612B:
         Use this function if you need exact time correlation between the current of the two channels.
         Examples:
             measure current simultaneously on both channels
-            >>> [i_chan_a, i_chan_b] = self.measure_current()
+            >>> i_chan_a, i_chan_b = self.measure_current()
         Returns:
-            list: a list of floats containing the two measured values.
-                current measurement of channel a as the first list element
-                current measurement of channel b as the second list element
+            tuple: the two measured values as floats.
+                current measurement of channel a as the first element
+                current measurement of channel b as the second element
         Raises:
             ValueError: If the SMU has just one channel
         """
@@ -600,11 +1043,11 @@ class SMU2612B:
         Use this function if you need exact time correlation between the resistance of the two channels.
         Examples:
             measure resistance simultaneously on both channels
-            >>> [r_chan_a, r_chan_b] = self.measure_resistance()
+            >>> r_chan_a, r_chan_b = self.measure_resistance()
         Returns:
-            list: a list of floats containing the two measured values.
-                resistance measurement of channel a as the first list element
-                resistance measurement of channel b as the second list element
+            tuple: the two measured values as floats.
+                resistance measurement of channel a as the first element
+                resistance measurement of channel b as the second element
         Raises:
             ValueError: If the SMU has just one channel
         """
@@ -615,11 +1058,11 @@ class SMU2612B:
         Use this function if you need exact time correlation between the power of the two channels.
         Examples:
             measure power simultaneously on both channels
-            >>> [p_chan_a, p_chan_b] = self.measure_power()
+            >>> p_chan_a, p_chan_b = self.measure_power()
         Returns:
-            list: a list of floats containing the two measured values.
-                power of channel a as the first list element
-                power of channel b as the second list element
+            tuple: the two measured values as floats.
+                power of channel a as the first element
+                power of channel b as the second element
         Raises:
             ValueError: If the SMU has just one channel
         """
@@ -630,38 +1073,152 @@ class SMU2612B:
         Use this function if you need exact time correlation between voltage and current of the two channels.
         Examples:
             measure current and voltage simultaneously on both channels
-            >>> [i_chan_a, v_chan_a, i_chan_b, v_chan_b] = self.measure_current_and_voltage()
+            >>> i_chan_a, v_chan_a, i_chan_b, v_chan_b = self.measure_current_and_voltage()
         Returns:
-            list: a list of floats containing the four measured values.
-                current of channel a as the first list element
-                voltage of channel a as the second list element
-                current of channel b as the third list element
-                voltage of channel b as the fourth list element
+            tuple: the four measured values as floats.
+                current of channel a as the first element
+                voltage of channel a as the second element
+                current of channel b as the third element
+                voltage of channel b as the fourth element
         Raises:
             ValueError: If the SMU has just one channel
         """
         return self._measure(SMU2612B.CHANNEL_ALL, SMU2612B.UNIT_CURRENT_VOLTAGE)
+    def measure_current_and_voltage_a_current_b(self):
+        """
+        Causes the SMU to trigger a voltage and current measurement on channel A and a current measurement on
+        channel B with one request to the SMU.
+        Use this function if channel A sources the device and channel B reads a detector (e.g. a photodiode).
+        Examples:
+            measure current and voltage of channel a and current of channel b
+            >>> i_chan_a, v_chan_a, i_chan_b = self.measure_current_and_voltage_a_current_b()
+        Returns:
+            tuple: the three measured values as floats.
+                current of channel a as the first element
+                voltage of channel a as the second element
+                current of channel b as the third element
+        Raises:
+            ValueError: If the SMU has just one channel
+        """
+        if not self.__channel_b_present:
+            raise ValueError("This device has only ONE channel. "
+                             "Use the measurement function of the channel instead.")
+        cmd = 'iChA, vChA = smua.measure.iv()\n' \
+              + 'iChB = smub.measure.i()\n' \
+              + 'print(iChA, vChA, iChB)'
+        reading = self.query_lua(cmd, check_for_errors=False)
+        if self.__error_polling:
+            self.flush_errors()
+        return tuple(float(value) for value in reading.split('\t'))
+    def measure_dual_voltage_sweep(self, source_channel, detector_channel, start_value, stop_value, settling_time,
+                                   points):
+        """
+        Causes the SMU to make a voltage sweep on the source channel based on a staircase profile and to measure
+        current and voltage of the source channel and the current of the detector channel at every step.
+        Both channels are triggered by the same timer of the SMU, so they measure at the same time and the whole
+        sweep takes only one request.
+        Args:
+            source_channel: the channel that sweeps the voltage (SMU2612B.CHANNEL_A or SMU2612B.CHANNEL_B)
+            detector_channel: the channel that measures the current of the detector (e.g. a photodiode)
+            start_value: the voltage level from which the sweep will start.
+            stop_value: the voltage level at which the sweep will stop.
+            settling_time: the time the unit will wait after a voltage step is reached before the measurements
+                are triggered.
+            points: the number of steps.
+        Note:
+           The SMU only answers after the last point, so the timeout has to be longer than the whole sweep.
+           Ranges and limits of the channels are not changed; set them before the sweep.
+        Examples:
+            sweep channel B from 0 V to 2 V in 21 steps with 10 ms settling time and read a photodiode on channel A
+            >>> current, voltage, current_pd = self.measure_dual_voltage_sweep(self.CHANNEL_B, self.CHANNEL_A,
+            >>>                                                                0, 2, 10e-3, 21)
+        Returns:
+            tuple: three numpy arrays (single precision)
+                first element is an array of the measured current of the source channel
+                second element is an array of the measured voltage of the source channel
+                third element is an array of the measured current of the detector channel
+        Raises:
+            ValueError: If the SMU has just one channel, source and detector are the same channel or there is no
+                point to measure
+        """
+        if source_channel not in _CHANNELS or detector_channel not in _CHANNELS or source_channel == detector_channel:
+            raise ValueError("Source and detector have to be two different channels (A and B).")
+        return self._measure_dual_sweep(source_channel, detector_channel,
+                                        'linearv(' + str(start_value) + ', ' + str(stop_value) + ', '
+                                        + str(points) + ')', settling_time, points)
+    def measure_dual_voltage_list_sweep(self, source_channel, detector_channel, voltages, settling_time):
+        """
+        Causes the SMU to source the given voltages one after the other on the source channel and to measure current
+        and voltage of the source channel and the current of the detector channel at every step.
+        Like measure_dual_voltage_sweep() the whole sweep runs on the SMU, the voltages are uploaded before.
+        Args:
+            source_channel: the channel that sources the voltages (SMU2612B.CHANNEL_A or SMU2612B.CHANNEL_B)
+            detector_channel: the channel that measures the current of the detector (e.g. a photodiode)
+            voltages: the voltage levels in the order they are sourced (list or numpy array).
+            settling_time: the time the unit will wait after a voltage step is reached before the measurements
+                are triggered.
+        Note:
+           The SMU only answers after the last point, so the timeout has to be longer than the whole sweep.
+           Ranges and limits of the channels are not changed; set them before the sweep.
+        Examples:
+            sweep channel A from 0 V to 5 V and back in 0.1 V steps with 10 ms settling time and read a photodiode
+            on channel B
+            >>> up = np.linspace(0, 5, 51)
+            >>> current, voltage, current_pd = self.measure_dual_voltage_list_sweep(self.CHANNEL_A, self.CHANNEL_B,
+            >>>                                                                     np.concatenate([up, up[::-1]]),
+            >>>                                                                     10e-3)
+        Returns:
+            tuple: three numpy arrays (single precision)
+                first element is an array of the measured current of the source channel
+                second element is an array of the measured voltage of the source channel
+                third element is an array of the measured current of the detector channel
+        Raises:
+            ValueError: If the SMU has just one channel, source and detector are the same channel or there is no
+                point to measure
+        """
+        if source_channel not in _CHANNELS or detector_channel not in _CHANNELS or source_channel == detector_channel:
+            raise ValueError("Source and detector have to be two different channels (A and B).")
+        voltages = [float(voltage) for voltage in voltages]
+        if not voltages:
+            raise ValueError("The sweep needs at least one point.")
+        # upload the list with one transfer, but in short lines
+        with self.batch():
+            self.write_lua('pyListValues = {}', check_for_errors=False)
+            for i in range(0, len(voltages), self.__LUA_LIST_CHUNK):
+                self.__call_lua_function('pyAppend', 'pyListValues',
+                                         '{' + ', '.join(str(voltage) for voltage in
+                                                         voltages[i:i + self.__LUA_LIST_CHUNK]) + '}')
+        return self._measure_dual_sweep(source_channel, detector_channel, 'listv(pyListValues)', settling_time,
+                                        len(voltages))
     """
     #####################################################################################
     commands for setting the parameters of channels
     those should not be accessed directly but through the channel class
     #####################################################################################
     """
+    def _write_setting(self, cmd):
+        """
+        writes a setter command without checking the error queue right away; its errors are reported by the next
+        measurement, at the end of a batch() block or by flush_errors()
+        """
+        if self.__batch_commands is not None:
+            # unlike write_lua(..., check_for_errors=False) this keeps the error check at the end of the batch
+            self.__batch_commands.append(cmd)
+            return
+        self.write_lua(cmd, check_for_errors=False)
     def _reset(self, channel):
         """restore the default settings"""
-        cmd = 'smu' + str(channel) + '.reset()'
-        self.write_lua(cmd)
+        self._write_setting(_CMD_RESET[channel])
+        self.__nplc[channel] = 1
     def _set_display(self, channel, function):
         """defines what measurement will be shown on the display"""
-        cmd = 'display.smu' + str(channel) + '.measure.func = display.MEASURE_' + str(function)
-        self.write_lua(cmd)
+        self._write_setting(_CMD_DISPLAY[channel, function])
     def _set_measurement_speed(self, channel, speed):
         """defines how many PLC (Power Line Cycles) a measurement takes"""
-        cmd = 'smu' + str(channel) + '.measure.nplc = ' + str(speed)
-        self.write_lua(cmd)
+        self._write_setting(_CMD_NPLC[channel].format(speed))
+        self.__nplc[channel] = speed
     def _set_mode(self, channel, mode):
-        cmd = 'smu' + str(channel) + '.source.func = ' + 'smu' + str(channel) + '.OUTPUT_' + str(mode)
-        self.write_lua(cmd)
+        self._write_setting(_CMD_MODE[channel, mode])
     def _set_sense_mode(self, channel, mode):
         """
         set 2-wire or 4-wire sense mode
@@ -671,58 +1228,29 @@ class SMU2612B:
             smua.sense = smua.SENSE_REMOTE
             smua.sense = smua.SENSE_LOCAL
         """
-        cmd = 'smu' + str(channel) + '.sense = ' + 'smu' + str(channel) + '.' + str(mode)
-        self.write_lua(cmd)
+        self._write_setting(_CMD_SENSE[channel, mode])
     def _set_autorange(self, channel, unit, state):
         """enables or disables the autorange feature"""
-        # set the source range
-        cmd = 'smu' + str(channel) + '.source.autorange' + str(unit) \
-              + ' = smu' + str(channel) + '.AUTORANGE_' + str(state)
-        self.write_lua(cmd)
-        # set the measurement range
-        cmd = 'smu' + str(channel) + '.measure.autorange' + str(unit) \
-              + ' = smu' + str(channel) + '.AUTORANGE_' + str(state)
-        self.write_lua(cmd)
-    def _set_range(self, channel, unit, range_value):
-        """Set the range to the given value (or to the next suitable range)"""
-        range_found = 0
+        # set the source and the measurement range
+        self._write_setting(_CMD_AUTORANGE[channel, unit, state])
+    def _find_range(self, unit, range_value):
+        """Returns the range matching the given value (or the next suitable range)"""
         # select the range you want to compare to based on the given type
-        if unit is self.UNIT_CURRENT:
+        if unit == self.UNIT_CURRENT:
             range_to_check = self.__current_ranges
-        elif unit is self.UNIT_VOLTAGE:
+        elif unit == self.UNIT_VOLTAGE:
             range_to_check = self.__voltage_ranges
         else:
-            raise ValueError('Type "' + str(unit) + '" is valid in range setting')
-        # find the range that fits the desired value best
-        if range_value in range_to_check:
-            range_found = range_value
-        else:
-            # if there is no exact match use the range that is best suitable
-            for v in sorted(range_to_check):
-                if v > range_value:
-                    range_found = v
-                    break
-            # if none of the ranges above work ... raise an error
-            if not range_found:
-                raise ValueError("no suitable range found")
-        # set the source range
-        cmd = 'smu' + str(channel) + '.source.range' + str(unit) + ' = ' + str(range_found)
-        self.write_lua(cmd)
-        # set the measurement range
-        cmd = 'smu' + str(channel) + '.measure.range' + str(unit) + ' = ' + str(range_found)
-        self.write_lua(cmd)
-    def _set_limit(self, channel, unit, value):
-        """command used to set the limits for voltage, current or power"""
-        # send the command to the SourceMeter
-        cmd = 'smu' + str(channel) + '.source.limit' + str(unit) + ' = ' + str(value)
-        self.write_lua(cmd)
-    def _set_level(self, channel, unit, value):
-        # send the command to the SourceMeter
-        cmd = 'smu' + str(channel) + '.source.level' + str(unit) + ' = ' + str(value)
-        self.write_lua(cmd)
+            raise ValueError('Type "' + str(unit) + '" is not valid in range setting')
+        # the ranges are sorted ascending, so the exact match or the next larger range (the one that is best
+        # suitable) is found by bisection
+        index = bisect.bisect_left(range_to_check, range_value)
+        # if none of the ranges work ... raise an error
+        if index == len(range_to_check):
+            raise ValueError("no suitable range found")
+        return range_to_check[index]
     def _set_output_state(self, channel, state):
-        cmd = 'smu' + str(channel) + '.source.output = smu' + str(channel) + '.OUTPUT_' + str(state)
-        self.write_lua(cmd)
+        self._write_setting(_CMD_OUTPUT[channel, state])
     """
     #####################################################################################
     commands for reading values from the channels
@@ -731,112 +1259,100 @@ class SMU2612B:
     """
     def _measure(self, channel, unit):
         """function for getting a single reading of the specified value"""
-        # if CHANNEL_ALL is specified this has only an effect on two channel units
-        if channel == SMU2612B.CHANNEL_ALL:
-            # if channel b is present then modify the LUA command
-            if self.__channel_b_present:
-                # In case we want to measure voltage and current we get four return parameters
-                # so the LUA command has to be different.
-                if unit == SMU2612B.UNIT_CURRENT_VOLTAGE:
-                    cmd = 'iChA, vChA = smua.measure.' + str(unit) + '()\n' \
-                          + 'iChB, vChB = smub.measure.' + str(unit) + '()\n' \
-                          + 'print(iChA, vChA, iChB, vChB)'
-                else:
-                    cmd = 'ChA = smua.measure.' + str(unit) + '()\n' \
-                          + 'ChB = smub.measure.' + str(unit) + '()\n' \
-                          + 'print(ChA, ChB)'
-            else:
-                raise ValueError("This device has only ONE channel. "
-                                 "Use the measurement function of the channel instead.")
-        else:
-            cmd = 'print(smu' + str(channel) + '.measure.' + str(unit) + '())'
-        reading = self.query_lua(cmd)
-        reading = reading.replace("'", "")
-        # if we get more than one value out then put it in a list
-        out = []
-        parts = reading.split("\t")
-        if len(parts) > 1:
-            for value in parts:
-                out.append(float(value))
-            return out
-        else:
-            return float(reading)
+        # CHANNEL_ALL (and channel B) only exist in the table of two channel units
+        try:
+            cmd = self.__cmd_measure[channel, unit]
+        except KeyError:
+            raise ValueError("This device has only ONE channel. "
+                             "Use the measurement function of the channel instead.") from None
+        reading = self.query_lua(cmd, check_for_errors=False)
+        # report errors of this measurement and of the setters since the last measurement
+        if self.__error_polling:
+            self.flush_errors()
+        # if we get more than one value out then return them as a tuple
+        parts = reading.split()
+        return tuple(map(float, parts)) if len(parts) > 1 else float(parts[0])
+    def __read_buffers(self, points, *buffers):
+        """
+        internal function to read the first `points` values of one or more buffers of the SMU
+        (e.g. smua.nvbuffer1.readings) into numpy arrays, one array per buffer. All buffers are read with the same
+        printbuffer calls.
+        """
+        # printbuffer sends the values of all buffers for one point after the other, so a request of n points
+        # returns n * len(buffers) values
+        chunk = max(self.__PYVISA_MAX_BUFFER_REQUEST // len(buffers), 1)
+        # read in the buffers chunk by chunk directly into the output array (one row per point)
+        values = np.empty((points, len(buffers)), dtype=np.float32)
+        # let printbuffer send the values as binary single precision floats
+        # (4 bytes per value instead of ~13 ASCII characters and no parsing of text on our side)
+        self.write_lua('format.data = format.REAL32\nformat.byteorder = format.LITTLEENDIAN', check_for_errors=False)
+        try:
+            for first in range(0, points, chunk):
+                last = min(first + chunk, points)
+                cmd = 'printbuffer(' + str(first + 1) + ', ' + str(last) + ', ' + ', '.join(buffers) + ')'
+                values[first:last] = self.__query_binary(cmd, (last - first) * len(buffers)).reshape(-1, len(buffers))
+        finally:
+            # switch back to ASCII (even if a read failed), so printbuffer answers in plain text for everybody else
+            self.write_lua('format.data = format.ASCII', check_for_errors=False)
+        # one array per buffer
+        return tuple(values.T)
     def _measure_linear_sweep(self, channel, unit, start_value, stop_value, settling_time, points):
         """function to sweep voltage or current and measure current resp. voltage"""
         sweep_unit = measure_unit = ''
-        if unit is self.UNIT_VOLTAGE:
+        if unit == self.UNIT_VOLTAGE:
             sweep_unit = 'V'
             measure_unit = 'I'
-        elif unit is self.UNIT_CURRENT:
+        elif unit == self.UNIT_CURRENT:
             sweep_unit = 'I'
             measure_unit = 'V'
         else:
-            ValueError('Only possible to sweep Voltage or Current')
-        # prepare the buffer
-        cmd = 'smu' + str(channel) + '.nvbuffer1.clear()\n' \
-              'smu' + str(channel) + '.nvbuffer1.appendmode = 1\n' \
-              'smu' + str(channel) + '.nvbuffer1.collectsourcevalues = 1\n' \
-              'smu' + str(channel) + '.measure.count = 1'
-        self.write_lua(cmd)
-        # construct the sweep command based on the given parameters
-        # SweepILinMeasureV(smua, 1e-3, 10e-3, 0.1, 10)
-        cmd = 'Sweep' + sweep_unit + 'LinMeasure' + measure_unit + '(smu' + str(channel) + ', ' \
-              + str(start_value) + ', ' + str(stop_value) + ', ' + str(settling_time) + ', ' + str(points) + ')'
-        self.write_lua(cmd, check_for_errors=False)
+            raise ValueError('Only possible to sweep Voltage or Current')
+        prefix = _CHANNEL_PREFIX[channel]
+        # prepare the buffer and start the sweep with one call; the SMU runs the whole staircase
+        # with its factory script, e.g. SweepILinMeasureV(smua, 1e-3, 10e-3, 0.1, 10)
+        self.__call_lua_function('pyLinearSweep', prefix, 'Sweep' + sweep_unit + 'LinMeasure' + measure_unit,
+                                 start_value, stop_value, settling_time, points)
         # wait till the measurement is finished
-        # we just try to read some values of the buffer. If we receive an answer we
-        # know that the measurement is finished
-        answer = None
-        cmd = 'print("Are you alive?")'
-        while answer is None:
-            try:
-                # query the values that are stored in the nvbuffer1
-                answer = self.query_lua(cmd, check_for_errors=False)
-            except pyvisa.VisaIOError:
-                # no answer yet ... we just try again
-                pass
+        self.__wait_complete(points * (settling_time + self.__nplc[channel] / self.__LINE_FREQUENCY))
         # clear any old readings that are in the buffer
         self.__instrument.clear()
-        # determine in how many chunks we need to read the buffer and what the start and end values are
-        quotient = points // self.__PYVISA_MAX_BUFFER_REQUEST
-        remainder = points % self.__PYVISA_MAX_BUFFER_REQUEST
-        # define the starting values for the buffer read
-        buffer_start_values = []
-        buffer_end_values = []
-        for i in range(quotient):
-            buffer_start_values.append(i * self.__PYVISA_MAX_BUFFER_REQUEST + 1)
-            buffer_end_values.append((i+1) * self.__PYVISA_MAX_BUFFER_REQUEST)
-        # the last value needs to be set to the amount of data points we have
-        if remainder != 0:
-            buffer_start_values.append(quotient * self.__PYVISA_MAX_BUFFER_REQUEST + 1)
-            buffer_end_values.append(quotient * self.__PYVISA_MAX_BUFFER_REQUEST + remainder)
-        # put the readings of the measured data in a list
-        measure_values = []
-        # read in the buffer and combine the output
-        for count in range(len(buffer_start_values)):
-            cmd = 'printbuffer(' + str(buffer_start_values[count]) + ', ' + str(buffer_end_values[count]) \
-                  + ', smu' + str(channel) + '.nvbuffer1.readings)'
-            answer = self.query_lua(cmd, check_for_errors=False)
-            parts = answer.split(",")
-            for value in parts:
-                measure_values.append(float(value))
-                # clear the visa input buffer
-            self.__instrument.clear()
-        # put the readings of the source values in a list
-        source_values = []
-        # read in the buffer and combine the output
-        for count in range(len(buffer_start_values)):
-            cmd = 'printbuffer(' + str(buffer_start_values[count]) + ', ' + str(buffer_end_values[count]) \
-                  + ', smu' + str(channel) + '.nvbuffer1.sourcevalues)'
-            answer = self.query_lua(cmd, check_for_errors=False)
-            parts = answer.split(",")
-            for value in parts:
-                source_values.append(float(value))
-                # clear the visa input buffer
-            self.__instrument.clear()
+        measure_values, source_values = self.__read_buffers(points, prefix + '.nvbuffer1.readings',
+                                                            prefix + '.nvbuffer1.sourcevalues')
+        # report errors of the sweep and of the setters before it
+        self.flush_errors()
         # always return the current as first parameter
-        if unit is self.UNIT_VOLTAGE:
-            return [measure_values, source_values]
+        if unit == self.UNIT_VOLTAGE:
+            return measure_values, source_values
         else:
-            return [source_values, measure_values]
-
+            return source_values, measure_values
+    def _measure_dual_sweep(self, source_channel, detector_channel, source_values, settling_time, points):
+        """
+        function to sweep the voltage of one channel and measure its current and voltage together with the current
+        of the other channel at every step. `source_values` is the LUA call that sets the voltages of the source
+        channel's trigger model, e.g. 'linearv(-2, 5, 71)'
+        """
+        # a trigger count of 0 makes the SMU trigger endlessly
+        if points < 1:
+            raise ValueError("The sweep needs at least one point.")
+        if not self.__channel_b_present:
+            raise ValueError("This device has only ONE channel. "
+                             "Use the sweep function of the channel instead.")
+        source = _CHANNEL_PREFIX[source_channel]
+        detector = _CHANNEL_PREFIX[detector_channel]
+        # the source channel steps through the voltages with its trigger model; after every source step
+        # trigger.timer[1] waits the settling time and then triggers the measurement of both channels.
+        # The function ends with waitcomplete(), so the SMU answers the next request only after the last point.
+        with self.batch():
+            self.write_lua(source + '.trigger.source.' + source_values, check_for_errors=False)
+            self.__call_lua_function('pyDualSweep', source, detector, settling_time, points)
+        # wait till the measurement is finished (both channels measure at the same time)
+        nplc = max(self.__nplc[source_channel], self.__nplc[detector_channel])
+        self.__wait_complete(points * (settling_time + nplc / self.__LINE_FREQUENCY))
+        # clear any old readings that are in the buffer
+        self.__instrument.clear()
+        current, voltage, detector_current = self.__read_buffers(points, source + '.nvbuffer1.readings',
+                                                                 source + '.nvbuffer2.readings',
+                                                                 detector + '.nvbuffer1.readings')
+        # report errors of the sweep and of the setters before it
+        self.flush_errors()
+        return current, voltage, detector_current
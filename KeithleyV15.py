@@ -5,6 +5,7 @@ written by: Peter Luidolt @ TUGraz
 last modified: 2016-12-21
 """
 
+import numpy as np
 import pyvisa
 
 
@@ -445,9 +446,9 @@ class _SMUChannel:
             >>> [current_list, voltage_list] = self.measure_voltage_sweep(0, 5, 0, 500)
 
         Returns:
-            list: the returning list contains itself two lists
-                first element is a list of the measured current values
-                second element is a list of the voltage source values (not the actual measured voltage)
+            list: the returning list contains two numpy arrays
+                first element is an array of the measured current values
+                second element is an array of the voltage source values (not the actual measured voltage)
         """
         return self.__smu._measure_linear_sweep(self.__channel, SMU26xx.UNIT_VOLTAGE,
                                                 start_value, stop_value, settling_time, points)
@@ -473,9 +474,9 @@ class _SMUChannel:
             >>> [current_list, voltage_list] = self.measure_voltage_sweep(1e-3, 0.1, 1, 1000)
 
         Returns:
-            list: the returning list contains itself two lists
-                first element is a list of the current source values (not the actual measured current)
-                second element is a list of the measured voltage
+            list: the returning list contains two numpy arrays
+                first element is an array of the current source values (not the actual measured current)
+                second element is an array of the measured voltage
         """
         return self.__smu._measure_linear_sweep(self.__channel, SMU26xx.UNIT_CURRENT,
                                                 start_value, stop_value, settling_time, points)
@@ -1040,31 +1041,30 @@ class SMU26xx:
             buffer_start_values.append(quotient * self.__PYVISA_MAX_BUFFER_REQUEST + 1)
             buffer_end_values.append(quotient * self.__PYVISA_MAX_BUFFER_REQUEST + remainder)
 
-        # put the readings of the measured data in a list
-        measure_values = []
+        # collect the readings of the measured data chunk by chunk
+        measure_chunks = []
         # read in the buffer and combine the output
         for count in range(len(buffer_start_values)):
             cmd = 'printbuffer(' + str(buffer_start_values[count]) + ', ' + str(buffer_end_values[count]) \
                   + ', smu' + str(channel) + '.nvbuffer1.readings)'
             answer = self.query_lua(cmd, check_for_errors=False)
-            parts = answer.split(",")
-            for value in parts:
-                measure_values.append(float(value))
-                # clear the visa input buffer
+            # numpy parses the comma separated values in C instead of one float() per value
+            measure_chunks.append(np.fromstring(answer, sep=','))
+            # clear the visa input buffer
             self.__instrument.clear()
+        measure_values = np.concatenate(measure_chunks) if measure_chunks else np.empty(0)
 
-        # put the readings of the source values in a list
-        source_values = []
+        # collect the readings of the source values chunk by chunk
+        source_chunks = []
         # read in the buffer and combine the output
         for count in range(len(buffer_start_values)):
             cmd = 'printbuffer(' + str(buffer_start_values[count]) + ', ' + str(buffer_end_values[count]) \
                   + ', smu' + str(channel) + '.nvbuffer1.sourcevalues)'
             answer = self.query_lua(cmd, check_for_errors=False)
-            parts = answer.split(",")
-            for value in parts:
-                source_values.append(float(value))
-                # clear the visa input buffer
+            source_chunks.append(np.fromstring(answer, sep=','))
+            # clear the visa input buffer
             self.__instrument.clear()
+        source_values = np.concatenate(source_chunks) if source_chunks else np.empty(0)
 
         # always return the current as first parameter
         if unit is self.UNIT_VOLTAGE:
@@ -9,9 +9,12 @@ last modified: 2021-10-04
 
 from Keithley2612B import SMU2612B
 import matplotlib.pyplot as plt
+import numpy as np
 import datetime
+import bisect
 import csv
 import time
+import sys
 
 """ ******* Connect to the Sourcemeter ******** """
 
@@ -25,29 +28,33 @@ smu_B = sm.get_channel(sm.CHANNEL_B)
 
 """ ******* Configure the SMU Channel A ******** """
 
-# reset to default settings
-smu_A.reset()
-# setup the operation mode
-smu_A.set_mode_voltage_source()
-# set the voltage and current parameters
-smu_A.set_voltage_range(10)
-smu_A.set_voltage_limit(10)
-smu_A.set_voltage(0)
-smu_A.set_current(0)
-smu_A.enable_current_autorange
-smu_A.display_current()
-smu_A.set_sense_2wire()
-smu_A.set_measurement_speed_normal()
+# send the whole configuration of the channel to the SMU in one message
+with sm.batch():
+        # reset to default settings
+        smu_A.reset()
+        # setup the operation mode
+        smu_A.set_mode_voltage_source()
+        # set the voltage and current parameters
+        smu_A.set_voltage_range(10)
+        smu_A.set_voltage_limit(10)
+        smu_A.set_voltage(0)
+        smu_A.set_current(0)
+        smu_A.enable_current_autorange()
+        smu_A.display_current()
+        smu_A.set_sense_2wire()
+        smu_A.set_measurement_speed_normal()
 """ ******* Configure the SMU Channel B ******** """
 
-# reset to default settings
-smu_B.reset()
-smu_B.display_current()
-smu_B.set_voltage_range(0.2)
-smu_B.set_voltage_limit(0.2)
-smu_B.enable_current_autorange
-smu_B.set_sense_2wire()
-smu_B.set_measurement_speed_normal()
+# send the whole configuration of the channel to the SMU in one message
+with sm.batch():
+        # reset to default settings
+        smu_B.reset()
+        smu_B.display_current()
+        smu_B.set_voltage_range(0.2)
+        smu_B.set_voltage_limit(0.2)
+        smu_B.enable_current_autorange()
+        smu_B.set_sense_2wire()
+        smu_B.set_measurement_speed_normal()
 
 """ ****** Parametres to calculate performance **** """
 """ CONCTANT """
@@ -73,89 +80,109 @@ alpha_eye = (phi_0 * eye_el) #alpha for Luminous Power Efficiency
 
 """ ******* For saving the data ******** """
 
-# Create unique filenames for saving the data
-time_for_name = datetime.datetime.now().strftime("%Y_%m_%d")
+# Create unique filenames for saving the data (with the time, so a second run on the same day gets its own files)
+time_for_name = datetime.datetime.now().strftime("%Y_%m_%d_%H%M%S")
 
 filename_csv = 'test-' + time_for_name +'-scan1.csv'
 filename_pdf = 'test-' + time_for_name +'-scan1.pdf'
-# Header for
-with open(filename_csv, 'a') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',',  lineterminator='\n')
-        writer.writerow(["Voltage (V)", "Current (mA)", "Current_pd (mA)", "Current (mA/cm^2)", "L (cd/m^2)", "EQE (%)", "LE (cd/A)", "PE (lm/W)"])
+# Header for the CSV-file, the file stays open and the data is written into it after the sweep
+csvfile = open(filename_csv, 'w', newline='', buffering=1<<20)
+writer = csv.writer(csvfile, delimiter=',',  lineterminator='\n')
+writer.writerow(["Voltage (V)", "Current (mA)", "Current_pd (mA)", "Current (mA/cm^2)", "L (cd/m^2)", "EQE (%)", "LE (cd/A)", "PE (lm/W)"])
 """ ******* Make a voltage-sweep and do some measurements ******** """
 # define sweep parameters
 sweep_start = -2
 sweep_end = 10
 sweep_step = 0.1
 delay_time = 10e-3 # 10 ms
-steps = int((sweep_end - sweep_start) / sweep_step) + 1
-
-# define variables we store the measurement in
-data_current = []
-data_current_cm = []
-data_voltage = []
-data_current_pd_a = []
-data_L = []
-
-# enable the output
-smu_A.enable_output()
-smu_B.enable_output()
+# round before truncating, otherwise a quotient like 69.99999999999999 loses the last step
+steps = int(round((sweep_end - sweep_start) / sweep_step)) + 1
+# the voltages of the sweep, calculated once (the end value is hit exactly)
+voltages = np.linspace(sweep_start, sweep_end, steps)
+# run the sweep on the SMU itself (fast) or step it from Python (needed to switch the current range step by step)
+sweep_on_instrument = True
+# print every data point to the console (after the sweep); set to False for unattended runs
+verbose = True
+# stepped sweep: once the current reaches current_thresholds[i] range and limit of Channel A
+# are set to current_ranges[i + 1]
+current_thresholds = [0.09, 0.19, 0.29, 0.69]
+current_ranges = [None, 0.2, 0.4, 0.7, 1.5] # 200mA, 400mA, 700mA, 1.5A
+# current limit of Channel A for the sweep on the SMU: the highest range the stepped sweep can end up with
+current_limit = current_ranges[-1] # 1.5A
+
+# define variables we store the measurement in (the derived values are calculated after the sweep)
+data_current = np.empty(steps)
+data_voltage = np.empty(steps)
+data_current_pd_a = np.empty(steps)
+
+# enable the output (both channels with one transfer)
+with sm.batch():
+        smu_A.enable_output()
+        smu_B.enable_output()
 
 time_start = time.time()
-# step through the voltages and get the values from the device
-for nr in range(steps):
-        time.sleep(delay_time)
-        # calculate the new voltage we want to set
-        voltage_to_set = sweep_start + (sweep_step * nr)
-        # set the new voltage to the SMU
-        smu_A.set_voltage(voltage_to_set)
-        # get current and voltage from the SMU and append it to the list so we can plot it later
-        [current, voltage] = smu_A.measure_current_and_voltage()
-        if abs(current) >= 0.09 and abs(current) <= 0.19:
-                smu_A.set_current_range(0.2)
-                smu_A.set_current_limit(0.2)
-        if abs(current) > 0.19 and abs(current) <= 0.29:
-                smu_A.set_current_range(0.4)  #400mA
-                smu_A.set_current_limit(0.4) #400mA
-        if abs(current) > 0.29 and abs(current) <= 0.4:
-                smu_A.set_current_range(0.7)  #700mA
-                smu_A.set_current_limit(0.7) #700mA
-        if abs(current) > 0.69 and abs(current) <= 1:
-                smu_A.set_current_range(1.5)  #1.5A
-                smu_A.set_current_limit(1.5) #1.5A
-        current_pd_a = smu_B.measure_current()
-        data_voltage.append(voltage)
-        data_current.append(current * 1000)
-        data_current_cm.append((current*1000)/(dev_area*1e4))
-        data_current_pd_a.append(current_pd_a * (-1000))
-        data_L.append(alpha*(current_pd_a*(-1))) #L (cd/m^2) for graphics
-        print('Voltage: '+str(voltage)+'V; Current:'+str(current * 1000)+'mA; J: '+str((1000*current)/(dev_area*1e4))+'mA/cm^2; Current_PD: '+str(current_pd_a*(-1000))+'mA; L:'+str(alpha*(current_pd_a*(-1)))+'cd/m^2')
+if sweep_on_instrument:
+        # the range can't be switched during the sweep on the SMU: set the limit the stepped sweep would end up
+        # with (setting the range first is required) and let autorange select the range for every point
+        with sm.batch():
+                smu_A.set_current_range(current_limit)
+                smu_A.set_current_limit(current_limit)
+                smu_A.enable_current_autorange()
+        # one request for the whole sweep: channel A steps the voltage and measures current and voltage,
+        # channel B measures the photodiode current at the same time
+        [current, voltage, current_pd_a] = sm.measure_dual_voltage_sweep(sm.CHANNEL_A, sm.CHANNEL_B,
+                                                                          voltages[0], voltages[-1], delay_time, steps)
+        # fill the arrays in one go (A -> mA)
+        data_voltage[:] = voltage
+        np.multiply(current, 1000, out=data_current)
+        np.multiply(current_pd_a, -1000, out=data_current_pd_a)
+else:
+        range_index = 0
+        # step through the voltages and get the values from the device
+        # no error check after every command; the error queue is checked once after the loop
+        with sm.error_polling(False):
+                for nr, voltage_to_set in enumerate(voltages):
+                        time.sleep(delay_time)
+                        # set the new voltage to the SMU
+                        smu_A.set_voltage(voltage_to_set)
+                        # get current and voltage from the SMU and append it to the list so we can plot it later
+                        [current, voltage] = smu_A.measure_current_and_voltage()
+                        # look up the range for this current and only talk to the SMU if the range changed
+                        new_range_index = bisect.bisect_right(current_thresholds, abs(current))
+                        if new_range_index != range_index and current_ranges[new_range_index] is not None:
+                                # range and limit with one transfer
+                                with sm.batch():
+                                        smu_A.set_current_range(current_ranges[new_range_index])
+                                        smu_A.set_current_limit(current_ranges[new_range_index])
+                                range_index = new_range_index
+                        current_pd_a = smu_B.measure_current()
+                        data_voltage[nr] = voltage
+                        data_current[nr] = current * 1000
+                        data_current_pd_a[nr] = current_pd_a * (-1000)
 time_finish = time.time()
 print('time: '+str(time_finish-time_start)+' sec.')
-# Write the data in a csv
-f = open(filename_csv, 'a')
-for i in range(steps):
-        f.write(str(data_voltage[i])) #Voltage (V)
-        f.write(',')
-        f.write(str(data_current[i])) #Current (mA)
-        f.write(',')
-        f.write(str(data_current_pd_a[i])) #Current PD (mA)
-        f.write(',')
-        f.write(str(data_current[i]/(dev_area*1e4))) #Current (mA/cm^2)
-        f.write(',')
-        f.write(str((alpha*(data_current_pd_a[i]/1000)))) # L (cd/m^2)
-        f.write(',')
-        f.write(str(((q/hc) * (lambda_EQE / ksi) * ((data_current_pd_a[i]/pin_area) / (data_current[i]/dev_area))) * 100)) #EQE (%)
-        f.write(',')
-        f.write(str((alpha*(data_current_pd_a[i]/1000))/((data_current[i]/1000)/dev_area))) # LE (cd/A)
-        f.write(',')
-        f.write(str((alpha_eye / ksi) * ((data_current_pd_a[i]/pin_area) / ((data_current[i]/dev_area) * data_voltage[i])))) # PE (lm/W)
-        f.write('\n')
-f.close()
+# calculate the performance of the device for all points at once
+data_current_cm = data_current / (dev_area*1e4) #Current (mA/cm^2)
+data_L = alpha * (data_current_pd_a / 1000) #L (cd/m^2)
+data_EQE = ((q/hc) * (lambda_EQE / ksi) * ((data_current_pd_a/pin_area) / (data_current/dev_area))) * 100 #EQE (%)
+data_LE = data_L / ((data_current/1000) / dev_area) #LE (cd/A)
+data_PE = (alpha_eye / ksi) * ((data_current_pd_a/pin_area) / ((data_current/dev_area) * data_voltage)) #PE (lm/W)
+if verbose:
+        # print all points in one go after the sweep, console output inside the loop would slow the sweep down
+        sys.stdout.writelines(f'Voltage: {voltage:.6g}V; Current:{current:.6g}mA; J: {current_cm:.6g}mA/cm^2; '
+                              f'Current_PD: {current_pd:.6g}mA; L:{L:.6g}cd/m^2\n'
+                              for voltage, current, current_pd, current_cm, L in
+                              zip(data_voltage, data_current, data_current_pd_a, data_current_cm, data_L))
+# Write the data in the csv (one row per point, same columns as the header); 6 significant digits are
+# the resolution of the SMU
+np.savetxt(csvfile, np.column_stack([data_voltage, data_current, data_current_pd_a, data_current_cm,
+                                       data_L, data_EQE, data_LE, data_PE]), delimiter=',', fmt='%.6g')
+csvfile.close()
 
 # disable the output
-smu_A.disable_output()
-smu_B.disable_output()
+with sm.batch():
+        smu_A.disable_output()
+        smu_B.disable_output()
 
 # properly disconnect from the device
 sm.disconnect()